@@ -11,10 +11,11 @@ MIN_SUPPORTED_PYTHON_VERSION = '3.11'
 assert sys.version_info >= tuple(map(int, MIN_SUPPORTED_PYTHON_VERSION.split('.')))
 
 import argparse
+import collections
 import copy
 import enum
 from textwrap import dedent
-from typing import Any, Generator
+from typing import Any, Generator, NamedTuple
 
 
 import gi
@@ -58,6 +59,17 @@ class ArgsBase(metaclass=ArgsMeta):
 		return f"{self.__class__.__name__}({attributes})"
 
 
+class OpGroupAction(argparse.Action):
+	"""Parse every `KEY OP [ARG ...]` group straight into an ArrayOp and collect them in order."""
+
+	def __call__(self, parser: argparse.ArgumentParser, namespace: argparse.Namespace, values: Any, option_string: str | None = None) -> None:
+		try:
+			op = Utils._parse_op_group(values)
+		except ValueError as e:
+			parser.error(str(e))
+		setattr(namespace, self.dest, [*(getattr(namespace, self.dest, None) or []), op])
+
+
 class SubCmdParserFactory:
 	class SubCmdParser:
 		def __init__(self, subcmdp: argparse.ArgumentParser):
@@ -82,19 +94,36 @@ class ArgCmdName(enum.StrEnum):
 	POP     = enum.auto()
 	RM      = enum.auto()
 	CLEAR   = enum.auto()
+	BATCH   = enum.auto()
+
+
+class ExitStatus(enum.IntEnum):
+	OK        = 0
+	# 1 is taken by error messages and 2 by argparse usage errors
+	UNCHANGED = 3
+
+
+class ArrayOp(NamedTuple):
+	key:      str
+	cmd:      ArgCmdName
+	position: int             = int(sys.maxsize)
+	items:    tuple[str, ...] = tuple()
+	reverse:  bool            = bool(False)
 
 
 class Args(ArgsBase):
-	CMD:     str; cmd:     ArgCmdName = ArgCmdName('')
-	SCHEMA:  str; schema:  str        = str()
-	KEY:     str; key:     str        = str()
-	INDEX:   str; index:   int        = int(sys.maxsize)
-	ITEMS:   str; items:   list[str]  = list()
+	CMD:     str; cmd:     ArgCmdName      = ArgCmdName('')
+	SCHEMA:  str; schema:  str             = str()
+	KEY:     str; key:     str             = str()
+	INDEX:   str; index:   int             = int(sys.maxsize)
+	ITEMS:   str; items:   list[str]       = list()
+	OPS:     str; ops:     list[ArrayOp]   = list()
 
 	OPT_SORT:    str; opt_sort:    bool = bool(False)
 	OPT_REVERSE: str; opt_reverse: bool = bool(False)
 	OPT_DEDUP:   str; opt_dedup:   bool = bool(False)
 	OPT_CLEAR:   str; opt_clear:   bool = bool(False)
+	OPT_DRY_RUN: str; opt_dry_run: bool = bool(False)
 
 
 class Utils:
@@ -123,6 +152,102 @@ class Utils:
 			quoted.append(item)
 		return quoted
 
+	@staticmethod
+	def _make_hashable(item: Any) -> Any:
+		if isinstance(item, dict):
+			return tuple(sorted((k, Utils._make_hashable(v)) for k, v in item.items()))
+		return tuple(Utils._make_hashable(e) for e in item) if isinstance(item, (list, tuple)) else item
+
+	@staticmethod
+	def _array_delta(old_array: list[Any], new_array: list[Any]) -> tuple[list[Any], list[Any]]:
+		"""Return items `(added, removed)` between the two arrays, duplicates are counted separately."""
+		def missing_from(array: list[Any], other: list[Any]) -> list[Any]:
+			remaining = collections.Counter(Utils._make_hashable(item) for item in other)
+			missing = []
+			for item in array:
+				item_hash = Utils._make_hashable(item)
+				if remaining[item_hash] > 0:
+					remaining[item_hash] -= 1
+				else:
+					missing.append(item)
+			return missing
+		return missing_from(new_array, old_array), missing_from(old_array, new_array)
+
+	@staticmethod
+	def _parse_op_group(group: list[str]) -> ArrayOp:
+		"""Turn a `KEY OP [ARG ...]` group of the `batch` command into an ArrayOp."""
+		C = ArgCmdName
+		if len(group) < 2:
+			raise ValueError(f"operation group {group} must have the form `KEY OP [ARG ...]`")
+		key, op, op_args = group[0], group[1], group[2:]
+		try:
+			cmd = C(op)
+		except ValueError:
+			cmd = C._
+		if cmd in (C.INSERT, C.POP):
+			if not op_args or (C.POP == cmd and len(op_args) != 1) or (C.INSERT == cmd and len(op_args) < 2):
+				usage = "INDEX" if C.POP == cmd else "INDEX ITEM [ITEM ...]"
+				raise ValueError(f"operation `{op}` on key '{key}' expects `{usage}`, got {op_args}")
+			try:
+				position = int(op_args[0])
+			except ValueError:
+				raise ValueError(f"invalid index '{op_args[0]}' for operation `{op}` on key '{key}'") from None
+			return ArrayOp(key, cmd, position=position, items=tuple(op_args[1:]))
+		if C.RM == cmd:
+			if not op_args:
+				raise ValueError(f"operation `{op}` on key '{key}' expects `ITEM [ITEM ...]`")
+			return ArrayOp(key, cmd, items=tuple(op_args))
+		if C.SORT == cmd:
+			if op_args not in ([], ['reverse']):
+				raise ValueError(f"operation `{op}` on key '{key}' accepts only an optional `reverse`, got {op_args}")
+			return ArrayOp(key, cmd, reverse=bool(op_args))
+		if cmd in (C.DEDUP, C.CLEAR):
+			if op_args:
+				raise ValueError(f"operation `{op}` on key '{key}' takes no arguments, got {op_args}")
+			return ArrayOp(key, cmd)
+		choices = ', '.join(c for c in (C.INSERT, C.POP, C.RM, C.SORT, C.DEDUP, C.CLEAR))
+		raise ValueError(f"unknown operation `{op}` on key '{key}', choose from: {choices}")
+
+
+class ArrayOps:
+	"""Pure in-memory implementations of the array commands, nothing here touches GSettings."""
+
+	@staticmethod
+	def insert(array: list[Any], index: int, items: list[Any]) -> list[Any]:
+		if index < 0:
+			index += len(array) + 1
+		return array[:index] + items + array[index:]
+
+	@staticmethod
+	def pop(array: list[Any], index: int) -> tuple[Any, list[Any]]:
+		mn, mx = -len(array), len(array)
+		if not mn <= index < mx:
+			raise IndexError(index)
+		if index < 0:
+			index += len(array)
+		return array[index], array[:index] + array[index + 1:]
+
+	@staticmethod
+	def rm(array: list[Any], items: list[Any]) -> list[Any]:
+		return [x for x in array if x not in items]
+
+	@staticmethod
+	def dedup(array: list[Any]) -> list[Any]:
+		new_array, seen = list(), set()
+		for item in array:
+			item_hash = Utils._make_hashable(item)
+			if item_hash not in seen:
+				seen.add(item_hash)
+				new_array.append(item)
+		return new_array
+
+	@staticmethod
+	def sort(array: list[Any], reverse: bool = False) -> list[Any]:
+		new_arr = sorted(array)
+		if reverse:
+			new_arr = list(reversed(new_arr))
+		return new_arr
+
 
 class App:
 	@staticmethod
@@ -153,10 +278,13 @@ class App:
 			C.POP:     subcmd(C.POP,    help="Print and remove the item at a specified index."),
 			C.RM:      subcmd(C.RM,     help="Remove one or more items from the array."),
 			C.CLEAR:   subcmd(C.CLEAR,  help="Clear all items from the array."),
+			C.BATCH:   subcmd(C.BATCH,  help="Apply several operations on one or more keys of a schema in a single atomic write.",
+			                  usage="%(prog)s [-h] [--dry-run] SCHEMA --op KEY OP [ARG ...] [--op KEY OP [ARG ...] ...]"),
 		}
 
 		for c in P.values():
 			c.arg(metavar='SCHEMA', dest=Args.SCHEMA, help="GSettings schema, eg. `org.gnome.desktop.input-sources`")
+		for c in (p for n, p in P.items() if n != C.BATCH):
 			c.arg(metavar='KEY',    dest=Args.KEY,    help="GSettings key, eg. `sources`")
 		for c in (P[C.INSERT], P[C.POP]):
 			c.arg(metavar='INDEX',  dest=Args.INDEX,  help="Array index, 0 = first, ..., -1 = last", type=int)
@@ -169,6 +297,12 @@ class App:
 		for c in (P[C.INSERT], P[C.POP], P[C.RM], P[C.SORT]):
 			c.arg('--reverse', dest=Args.OPT_REVERSE, help="Reverse orientation of the sort", action='store_true')
 			c.arg('--dedup',   dest=Args.OPT_DEDUP,   help="Run `dedup` after  main task",    action='store_true')
+		for c in (P[C.BATCH],):
+			c.arg('-o', '--op', metavar=('KEY OP', 'ARG'), dest=Args.OPS, action=OpGroupAction, nargs=argparse.ONE_OR_MORE, required=True,
+			      help="Operation group `KEY OP [ARG ...]`, where OP is one of `insert INDEX ITEM [ITEM ...]`, `pop INDEX`, "
+			           "`rm ITEM [ITEM ...]`, `sort [reverse]`, `dedup` or `clear`. Repeat for more operations, they are applied in order.")
+		for c in (p for n, p in P.items() if n != C.LS):
+			c.arg('--dry-run', dest=Args.OPT_DRY_RUN, help=f"Only report the planned changes and their cost, exit with {ExitStatus.UNCHANGED:d} if nothing would change", action='store_true')
 
 		args_ns = main_parser.parse_args(raw_arg_list)
 		args = Args(args_ns)
@@ -178,102 +312,180 @@ class App:
 
 		return args
 
-	@classmethod
-	def run(cls, raw_arg_list: list[str] | None = None) -> int | str:
-		args = cls._parse_args(raw_arg_list)
-		
-		schema = Utils._maybe_get_schema(args.schema)
-		if not schema:
-			return dedent(f"""
-				Error: Schema '{args.schema}' not found. 
-				Please check if the schema name is correct and exists in your system. 
-				You can list available schemas using 'gsettings list-schemas'.
-				Args: {args}
-				""").strip()
-		if not schema.has_key(args.key):
+	@staticmethod
+	def _check_key(schema: Gio.SettingsSchema, key: str, args: Args) -> str | None:
+		if not schema.has_key(key):
 			return dedent(f"""
-				Error: Key '{args.key}' not found in schema '{args.schema}'.
+				Error: Key '{key}' not found in schema '{args.schema}'.
 				Please check if the key name is correct. 
 				You can list available keys for this schema using 'gsettings list-keys {args.schema}'.
 				Args: {args}
 				""").strip()
 
-		array_type = schema.get_key(args.key).get_value_type()
+		array_type = schema.get_key(key).get_value_type()
 		if not array_type.is_array():
 			return dedent(f"""
-				Error: The key '{args.key}' in schema '{args.schema}' is not an array.
+				Error: The key '{key}' in schema '{args.schema}' is not an array.
 				Its type is '{array_type.dup_string()}'. This tool only works with array-type keys.
 				Please choose a different key or use plain 'gsettings' command for non-array types.
 				Args: {args}
 				""").strip()
 
-		gsettings = Gio.Settings.new(args.schema)
-		old_array = gsettings[args.key]
+		return None
 
-		should_print_diff = args.cmd not in (ArgCmdName.LS, )
-		if should_print_diff:
-			print("Old value:", old_array, file=sys.stderr)
+	@staticmethod
+	def _report_plan(gsettings: Gio.Settings, old_arrays: dict[str, list[Any]], new_arrays: dict[str, list[Any]], popped: list[tuple[str, Any]]) -> int:
+		"""Print what committing `new_arrays` would do and return the number of writes it would issue."""
+		writes = 0
+		for key, new_array in new_arrays.items():
+			old_array = old_arrays[key]
+			key_popped = Utils._quote_possible_strings([item for k, item in popped if k == key])
+			if new_array == old_array:
+				print(f"{key}: unchanged")
+				for item in key_popped:
+					print(f"    popped:  {item}")
+				continue
+			writes += 1
+
+			# The unpacked old array has lost its `v` wrappers and may not pack back, so measure the stored value.
+			old_value = gsettings.get_value(key)
+			old_size = old_value.get_size()
+			new_size = GLib.Variant(old_value.get_type_string(), new_array).get_size()
+			added, removed = Utils._array_delta(old_array, new_array)
+
+			print(f"{key}: changed")
+			print(f"    old:     {old_array}")
+			print(f"    new:     {new_array}")
+			for item in key_popped:
+				print(f"    popped:  {item}")
+			for item in Utils._quote_possible_strings(added):
+				print(f"    added:   {item}")
+			for item in Utils._quote_possible_strings(removed):
+				print(f"    removed: {item}")
+			if not (added or removed):
+				print("    reordered")
+			print(f"    size:    {old_size} -> {new_size} bytes")
+		print(f"writes: {writes}")
+		return writes
 
-		input_array_str = "[%s]" % ",".join(Utils._quote_possible_strings(args.items)) if args.items else "[]"
-		parsed_array = GLib.Variant.parse(array_type, input_array_str)
+	@staticmethod
+	def _ops_from_args(args: Args) -> list[ArrayOp]:
+		C = ArgCmdName
+		if C.BATCH == args.cmd:
+			return list(args.ops)
+
+		ops = []
+		if C.CLEAR == args.cmd or args.opt_clear:
+			ops.append(ArrayOp(args.key, C.CLEAR))
+		if args.cmd in (C.INSERT, C.POP, C.RM):
+			ops.append(ArrayOp(args.key, args.cmd, position=args.index, items=tuple(args.items)))
+		if C.DEDUP == args.cmd or args.opt_dedup:
+			ops.append(ArrayOp(args.key, C.DEDUP))
+		if C.SORT == args.cmd or args.opt_sort:
+			ops.append(ArrayOp(args.key, C.SORT, reverse=args.opt_reverse))
+		return ops
 
-		if ArgCmdName.LS == args.cmd:
-			for item in Utils._quote_possible_strings(old_array):
-				print(item)
+	@classmethod
+	def run(cls, raw_arg_list: list[str] | None = None) -> int | str:
+		args = cls._parse_args(raw_arg_list)
+		C = ArgCmdName
+		
+		schema = Utils._maybe_get_schema(args.schema)
+		if not schema:
+			return dedent(f"""
+				Error: Schema '{args.schema}' not found. 
+				Please check if the schema name is correct and exists in your system. 
+				You can list available schemas using 'gsettings list-schemas'.
+				Args: {args}
+				""").strip()
 
-		if ArgCmdName.CLEAR == args.cmd or args.opt_clear:
-			old_array = gsettings[args.key] = []
-
-		if ArgCmdName.INSERT == args.cmd:
-			i = args.index
-			if i < 0:
-				i += len(old_array) + 1
-			gsettings[args.key] = old_array[:i] + list(parsed_array) + old_array[i:]
-
-		if ArgCmdName.POP == args.cmd and len(old_array):
-			i = args.index
-			mn, mx = -len(old_array), len(old_array)
-			if mn <= i < mx:
-				if i < 0:
-					i += len(old_array)
-				print(Utils._quote_possible_strings([old_array[i]])[0])
-				gsettings[args.key] = old_array[:i] + old_array[i + 1:]
-			else:
+		ops = cls._ops_from_args(args)
+		keys = list(dict.fromkeys(op.key for op in ops)) if C.BATCH == args.cmd else [args.key]
+		for key in keys:
+			if error := cls._check_key(schema, key, args):
+				return error
+
+		# Parse the items of all operations before reading or writing anything,
+		# so that a typo in the last operation cannot leave the earlier ones half-applied.
+		parsed_items: list[list[Any]] = []
+		for op in ops:
+			array_type = schema.get_key(op.key).get_value_type()
+			input_array_str = "[%s]" % ",".join(Utils._quote_possible_strings(list(op.items))) if op.items else "[]"
+			try:
+				parsed_items.append(GLib.Variant.parse(array_type, input_array_str).unpack())
+			except GLib.Error as e:
 				return dedent(f"""
-					Error: Index {args.index} is out of bounds.
-					The valid range for this array is {mn} <= INDEX < {mx}.
-					Please choose an index within this range.
-					Current array length: {len(old_array)}
+					Error: Cannot parse items {list(op.items)} for key '{op.key}' of type '{array_type.dup_string()}'.
+					Reason: {e.message}
+					Args: {args}
 					""").strip()
 
-		if ArgCmdName.RM == args.cmd:
-			gsettings[args.key] = [x for x in old_array if x not in parsed_array]
-
-		if ArgCmdName.DEDUP == args.cmd or args.opt_dedup:
-			def make_hashable(item: Any) -> Any:
-				return tuple(make_hashable(e) for e in item) if isinstance(item, (list, tuple)) else item
-			new_array, seen = list(), set()
-			for item in old_array:
-				item_hash = make_hashable(item)
-				if item_hash not in seen:
-					seen.add(item_hash)
-					new_array.append(item)
-			gsettings[args.key] = new_array
-
-		if ArgCmdName.SORT == args.cmd or args.opt_sort:
-			new_arr = sorted(old_array)
-			if args.opt_reverse:
-				new_arr = list(reversed(new_arr))
-			gsettings[args.key] = new_arr
+		gsettings = Gio.Settings.new(args.schema)
+		old_arrays = {key: gsettings[key] for key in keys}
+
+		if C.LS == args.cmd:
+			for item in Utils._quote_possible_strings(old_arrays[args.key]):
+				print(item)
+			return ExitStatus.OK
+
+		def label(key: str) -> str:
+			return f"[{key}] " if C.BATCH == args.cmd else ""
+
+		if not args.opt_dry_run:
+			for key in keys:
+				print(f"{label(key)}Old value:", old_arrays[key], file=sys.stderr)
+
+		new_arrays, popped = dict(old_arrays), list()
+		for op, items in zip(ops, parsed_items):
+			array = new_arrays[op.key]
+			if C.CLEAR == op.cmd:
+				array = []
+			elif C.INSERT == op.cmd:
+				array = ArrayOps.insert(array, op.position, items)
+			# a lone `pop` on an empty array is a no-op, but within a batch it would silently break the all-or-nothing promise
+			elif C.POP == op.cmd and (len(array) or C.BATCH == args.cmd):
+				try:
+					item, array = ArrayOps.pop(array, op.position)
+				except IndexError:
+					return dedent(f"""
+						Error: Index {op.position} is out of bounds for key '{op.key}'.
+						The valid range for this array is {-len(array)} <= INDEX < {len(array)}.
+						Please choose an index within this range.
+						Current array length: {len(array)}
+						""").strip()
+				popped.append((op.key, item))
+			elif C.RM == op.cmd:
+				array = ArrayOps.rm(array, items)
+			elif C.DEDUP == op.cmd:
+				array = ArrayOps.dedup(array)
+			elif C.SORT == op.cmd:
+				array = ArrayOps.sort(array, op.reverse)
+			new_arrays[op.key] = array
+
+		if args.opt_dry_run:
+			writes = cls._report_plan(gsettings, old_arrays, new_arrays, popped)
+			return ExitStatus.OK if writes else ExitStatus.UNCHANGED
+
+		for item in Utils._quote_possible_strings([item for _, item in popped]):
+			print(item)
+
+		# All arrays are final at this point, so stage them and let the backend commit
+		# them in a single transaction - one change notification, no inconsistent window.
+		# Keys which ended up unchanged are not written at all.
+		gsettings.delay()
+		for key, array in new_arrays.items():
+			if array != old_arrays[key]:
+				gsettings[key] = array
+		gsettings.apply()
 
 		# Writes made to a GSettings are handled asynchronously.
 		# Without sync(), new changes won't take effect at all!
 		gsettings.sync()
 
-		if should_print_diff:
-			print("New value:", gsettings[args.key], file=sys.stderr)
+		for key in keys:
+			print(f"{label(key)}New value:", gsettings[key], file=sys.stderr)
 
-		return 0
+		return ExitStatus.OK
 
 
 def main(raw_arg_list: list[str] | None = None) -> int | str:
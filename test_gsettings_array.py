@@ -73,6 +73,9 @@ def schema_setup() -> Generator[Dict[str, str], None, None]:
                 .add_key('test-array-of-arrays', 'aas', '[]')
                 .add_key('test-array-of-tuples', 'a(si)', '[]')
                 .add_key('test-array-of-tuples-of-arrays', 'a(sai)', '[]')
+                .add_key('test-array-of-dicts', 'aa{ss}', '[]')
+                .add_key('test-array-of-variant-dicts', 'aa{sv}', '[]')
+                .add_key('test-non-array', 's', "''")
                 .build(),
             'non_array_schema': SchemaBuilder('org.example.test2', '/org/example/test2/')
                 .add_key('test-string', 's', "''")
@@ -210,5 +213,83 @@ def test_rm_command(schema_setup, key, initial, test, remove, expected):
     assert result.returncode == 0
     assert settings.get_value(key).unpack() == expected
 
+@pytest.mark.parametrize("ops,                                                                             expected_array,    expected_int_array", [
+    ([['test-array', 'insert', '0', 'b'], ['test-int-array', 'insert', '-1', '3']],          ['b', 'a', 'c'],   [1, 2, 3]),
+    ([['test-array', 'rm', 'a'], ['test-array', 'insert', '0', 'z'], ['test-array', 'sort']], ['c', 'z'],        [1, 2]),
+    ([['test-array', 'sort', 'reverse'], ['test-int-array', 'clear']],                       ['c', 'a'],        []),
+    ([['test-int-array', 'insert', '0', '2'], ['test-int-array', 'dedup']],                  ['a', 'c'],        [2, 1]),
+])
+def test_batch_command(schema_setup, ops, expected_array, expected_int_array):
+    schema_id = schema_setup['array_schema']
+    settings = set_and_test(schema_id, 'test-array', "['a', 'c']", ["'a'", "'c'"])
+    set_and_test(schema_id, 'test-int-array', "[1, 2]", ['1', '2'])
+    result = run_cli(['batch', schema_id, *[arg for op in ops for arg in ['--op', *op]]])
+    assert result.returncode == 0
+    assert settings.get_value('test-array').unpack() == expected_array
+    assert settings.get_value('test-int-array').unpack() == expected_int_array
+
+@pytest.mark.parametrize("ops", [
+    [['test-array', 'insert', '0', 'b'], ['test-int-array', 'insert', '0', 'not-a-number']],
+    [['test-array', 'insert', '0', 'b'], ['test-int-array', 'pop', '5']],
+    [['test-array', 'insert', '0', 'b'], ['test-string', 'clear']],
+    [['test-array', 'insert', '0', 'b'], ['test-non-array', 'clear']],
+    [['test-array', 'insert', '0', 'b'], ['test-int-array', 'clear'], ['test-int-array', 'pop', '0']],
+])
+def test_batch_command_is_atomic(schema_setup, ops):
+    schema_id = schema_setup['array_schema']
+    settings = set_and_test(schema_id, 'test-array', "['a', 'c']", ["'a'", "'c'"])
+    set_and_test(schema_id, 'test-int-array', "[1, 2]", ['1', '2'])
+    result = run_cli(['batch', schema_id, *[arg for op in ops for arg in ['--op', *op]]])
+    assert result.returncode != 0
+    assert settings.get_value('test-array').unpack() == ['a', 'c']
+    assert settings.get_value('test-int-array').unpack() == [1, 2]
+
+@pytest.mark.parametrize("args,                                                 returncode, expected_stdout", [
+    (['insert', '--dry-run', 'SCHEMA', 'test-array', '0', 'b'],  0,          ["test-array: changed", "added:   'b'", "writes: 1"]),
+    (['rm', '--dry-run', 'SCHEMA', 'test-array', 'a'],           0,          ["removed: 'a'", "writes: 1"]),
+    (['sort', '--dry-run', '--reverse', 'SCHEMA', 'test-array'], 0,          ["reordered", "writes: 1"]),
+    (['pop', '--dry-run', 'SCHEMA', 'test-array', '-1'],         0,          ["popped:  'c'", "removed: 'c'", "size:    6 -> 3 bytes"]),
+    (['sort', '--dry-run', 'SCHEMA', 'test-array'],              3,          ["test-array: unchanged", "writes: 0"]),
+    (['dedup', '--dry-run', 'SCHEMA', 'test-array'],             3,          ["writes: 0"]),
+    (['rm', '--dry-run', 'SCHEMA', 'test-array', 'z'],           3,          ["writes: 0"]),
+    (['batch', '--dry-run', 'SCHEMA', '--op', 'test-array', 'sort'], 3,      ["test-array: unchanged", "writes: 0"]),
+])
+def test_dry_run(schema_setup, args, returncode, expected_stdout):
+    schema_id = schema_setup['array_schema']
+    settings = set_and_test(schema_id, 'test-array', "['a', 'c']", ["'a'", "'c'"])
+    result = run_cli([schema_id if arg == 'SCHEMA' else arg for arg in args])
+    assert result.returncode == returncode
+    for line in expected_stdout:
+        assert line in result.stdout
+    assert settings.get_value('test-array').unpack() == ['a', 'c']
+
+@pytest.mark.parametrize("key,                      value,              args", [
+    ('test-array-of-dicts',         "[{'k': 'v'}]",     ['clear']),
+    ('test-array-of-dicts',         "[{'k': 'v'}]",     ['pop', '0']),
+    ('test-array-of-variant-dicts', "[{'k': <1>}]",     ['clear']),
+    ('test-array-of-variant-dicts', "[{'k': <1>}]",     ['pop', '0']),
+])
+def test_dry_run_dict_arrays(schema_setup, key, value, args):
+    schema_id = schema_setup['array_schema']
+    settings = Gio.Settings.new(schema_id)
+    settings.set_value(key, GLib.Variant.parse(None, value))
+    settings.sync()
+    result = run_cli([args[0], '--dry-run', schema_id, key, *args[1:]])
+    assert result.returncode == 0
+    assert f"{key}: changed" in result.stdout
+    assert "writes: 1" in result.stdout
+    assert settings.get_value(key).print_(False) == value
+
+def test_batch_dry_run(schema_setup):
+    schema_id = schema_setup['array_schema']
+    settings = set_and_test(schema_id, 'test-array', "['a', 'c']", ["'a'", "'c'"])
+    set_and_test(schema_id, 'test-int-array', "[1, 2]", ['1', '2'])
+    result = run_cli(['batch', '--dry-run', schema_id, '--op', 'test-array', 'clear', '--op', 'test-int-array', 'sort'])
+    assert result.returncode == 0
+    assert "test-array: changed" in result.stdout
+    assert "test-int-array: unchanged" in result.stdout
+    assert "writes: 1" in result.stdout
+    assert settings.get_value('test-array').unpack() == ['a', 'c']
+
 if __name__ == '__main__':
     pytest.main([__file__])
\ No newline at end of file